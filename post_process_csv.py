@@ -1,7 +1,19 @@
-import argparse, gzip
+import argparse, functools, gzip, math, mmap, os, re
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
-from collections import Counter
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+
+try:
+    import numba
+except ImportError:
+    numba = None
 
 
 def open_file(filename):
@@ -9,13 +21,114 @@ def open_file(filename):
     return open_func(filename, "rt")
 
 
+def read_csv_chunks(filename, chunksize):
+    """Yield DataFrames with columns FEN, W, D, L of about chunksize lines each.
+    Uses pyarrow's multithreaded reader if available, and pandas otherwise."""
+    names = ["FEN", "W", "D", "L"]
+    if pa is not None:
+        reader = pacsv.open_csv(
+            filename,  # any compression is inferred from the file extension
+            read_options=pacsv.ReadOptions(
+                skip_rows=1,
+                column_names=names,
+                block_size=min(chunksize * 128, 2**31 - 1),  # an int32 in arrow
+            ),
+            convert_options=pacsv.ConvertOptions(
+                column_types={c: pa.int64() for c in names[1:]}
+            ),
+        )
+        for batch in reader:
+            yield batch.to_pandas()
+        return
+    with pd.read_csv(
+        filename,
+        names=names,
+        skiprows=1,
+        skipinitialspace=True,
+        dtype={c: np.int64 for c in names[1:]},
+        engine="c",
+        compression="infer",
+        chunksize=chunksize,
+    ) as reader:
+        yield from reader
+
+
+@functools.lru_cache(maxsize=None)
 def format_large_number(number):
     suffixes = ["", "K", "M", "G", "T", "P"]
-    for suffix in suffixes:
-        if number < 1000:
-            return f"{number:.0f}{suffix}"
-        number /= 1000
-    return f"{number:.0f}{suffixes[-1]}"
+    idx = 0 if number < 1000 else min(len(suffixes) - 1, int(math.log10(number) / 3))
+    if idx and number < 1000**idx:  # guard against log10 rounding up
+        idx -= 1
+    return f"{number / 1000**idx:.0f}{suffixes[idx]}"
+
+
+def fen_keys(fens):
+    """Return just the hashed move counter free keys of a Series of FENs, see
+    split_fens."""
+    keys = [" ".join(fen.split(maxsplit=4)[:4]) for fen in fens.to_numpy(dtype=object)]
+    return pd.util.hash_array(np.array(keys, dtype=object))
+
+
+def split_fens(fens):
+    """Return the hashed move counter free keys, the normalized FENs, the side to
+    move and the plies (-1 if unknown) for a Series of FENs.
+    The keys are 64 bit hashes of the first four FEN fields."""
+    keys, normalized, stm, ply = [], [], [], []
+    # a single pass without keeping the split fields around, to save memory
+    for fen in fens.to_numpy(dtype=object):
+        fields = fen.split(maxsplit=6)
+        assert len(fields) >= 4, "Incomplete FEN in input"
+        keys.append(" ".join(fields[:4]))
+        normalized.append(" ".join(fields[:6]))
+        stm.append(fields[1])
+        valid = len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit()
+        ply.append(
+            max((int(fields[5]) - 1) * 2 + (fields[1] == "b"), -1) if valid else -1
+        )
+    return pd.DataFrame(
+        {
+            "key": pd.util.hash_array(np.array(keys, dtype=object)),
+            "FEN": normalized,
+            "stm": stm,
+            "ply": np.array(ply, dtype=np.int64),
+        },
+        index=fens.index,
+    )
+
+
+def aggregate_wdl(df):
+    """Sum up the WDL stats for each "key", keeping the first FEN seen."""
+    wdl = df.groupby("key", sort=False, as_index=False)[["W", "D", "L"]].sum()
+    # the groups are in order of first appearance
+    first = ~df["key"].duplicated().to_numpy()
+    wdl.insert(1, "FEN", df["FEN"].array[first])
+    return wdl
+
+
+if numba is not None:
+
+    @numba.njit(cache=True)
+    def bincount_stats(W, D, L, white, ply):
+        """Single pass version of the histograms computed in calculate_stats."""
+        max_G = max_ply = -1
+        for i in range(W.shape[0]):
+            max_G = max(max_G, W[i] + D[i] + L[i])
+            max_ply = max(max_ply, ply[i])
+        games = np.zeros(max_G + 1, np.int64)
+        drawrate = np.zeros(101, np.int64)
+        depth = np.zeros(max_ply + 1, np.int64)
+        total_count = white_count = 0
+        for i in range(W.shape[0]):
+            G = W[i] + D[i] + L[i]
+            games[G] += 1
+            if G > 0:
+                drawrate[int(D[i] / G * 100)] += 1
+            if ply[i] >= 0:
+                depth[ply[i]] += 1
+            total_count += G
+            if white[i]:
+                white_count += G
+        return games, drawrate, depth, total_count, white_count
 
 
 def verbose_savefig(filename):
@@ -24,28 +137,106 @@ def verbose_savefig(filename):
 
 
 class csvdata:
-    def __init__(self, filename=None):
-        self.fenwdl = {}  # dict with mapping fenkey -> [fen, W, D, L]
+    # per book exit arrays: key hash, fen, W, D, L, white to move, ply (-1 if unknown)
+    columns = ["keys", "fens", "W", "D", "L", "white", "ply"]
+    # bump whenever the cached data changes, e.g. the key hashing
+    cache_version = 1
+
+    def __init__(self, filename=None, chunksize=25_000, cache=False):
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.fens = np.empty(0, dtype=object)
+        self.W, self.D, self.L, self.ply = (np.empty(0, np.int64) for _ in range(4))
+        self.white = np.empty(0, bool)
         self.book = None
         self.prefix = None
         if not filename:
             return
         self.prefix, _, _ = filename.rpartition(".csv")
-        with open_file(filename) as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith("FEN"):
-                    continue
-                fields = line.split(",")
-                assert len(fields) >= 4, f"Missing WDL data in {line}"
-                fenfields = fields[0].split()
-                assert len(fenfields) >= 4, f"Incomplete FEN {fields[0]}"
-                key = " ".join(fenfields[:4])  # ignore move counters
-                fen = " ".join(fenfields[:6])
-                if key not in self.fenwdl:
-                    self.fenwdl[key] = [fen, 0, 0, 0]
-                for i in [1, 2, 3]:
-                    self.fenwdl[key][i] += int(fields[i])
+        head, tail = os.path.split(filename)
+        cacheFile = os.path.join(head, f".{tail}.cache.npz")
+        stat = os.stat(filename)
+        if cache and self.load_cache(cacheFile, stat):
+            print(f"Loaded the parsed data of {filename} from {cacheFile}.")
+            return
+        wdl, parts = None, []
+        for chunk in read_csv_chunks(filename, chunksize):
+            parts.append(aggregate_wdl(chunk.assign(key=fen_keys(chunk["FEN"]))))
+            # merge only once the parts outgrow the merged data, to keep it linear
+            if wdl is None or sum(map(len, parts)) >= len(wdl):
+                wdl = aggregate_wdl(pd.concat([wdl, *parts], ignore_index=True))
+                parts = []
+        if parts:
+            wdl = aggregate_wdl(pd.concat([wdl, *parts], ignore_index=True))
+        if wdl is not None:
+            # only parse the FEN of each unique book exit in full
+            wdl = split_fens(wdl["FEN"]).join(wdl[["W", "D", "L"]])
+            self.add_exits(wdl.set_index("key"))
+        if cache:
+            self.save_cache(cacheFile, stat)
+
+    def save_cache(self, cacheFile, stat):
+        """Save the parsed arrays, tagged with the source file's mtime and size."""
+        data = {c: getattr(self, c) for c in self.columns if c != "fens"}
+        # store the FENs as one byte buffer, to avoid pickling an object array
+        data["fens"] = np.frombuffer("\n".join(self.fens).encode(), dtype=np.uint8)
+        # write to a temporary file first, so no half-written cache is left behind
+        tmpFile = f"{cacheFile}.{os.getpid()}.tmp"
+        try:
+            with open(tmpFile, "wb") as f:
+                np.savez_compressed(
+                    f,
+                    version=self.cache_version,
+                    mtime=stat.st_mtime_ns,
+                    size=stat.st_size,
+                    **data,
+                )
+            os.replace(tmpFile, cacheFile)
+        except Exception as e:
+            print(f"Warning: could not save the cache {cacheFile}: {e}")
+            if os.path.exists(tmpFile):
+                os.remove(tmpFile)
+
+    def load_cache(self, cacheFile, stat):
+        """Load the arrays from cacheFile if it matches the source file's stat.
+        Any unreadable cache counts as a miss."""
+        try:
+            with np.load(cacheFile) as data:
+                if (
+                    data["version"] != self.cache_version
+                    or data["mtime"] != stat.st_mtime_ns
+                    or data["size"] != stat.st_size
+                ):
+                    return False
+                arrays = {c: data[c] for c in self.columns}
+            fens = arrays["fens"].tobytes().decode().split("\n")
+            arrays["fens"] = np.array(fens if len(arrays["keys"]) else [], dtype=object)
+        except Exception:
+            return False
+        for c in self.columns:
+            setattr(self, c, arrays[c])
+        return True
+
+    def add_exits(self, wdl):
+        """Append the rows of a DataFrame indexed by the key hashes, with the
+        columns of split_fens and the WDL stats."""
+        new = {
+            "keys": wdl.index.to_numpy(dtype=np.uint64),
+            "fens": wdl["FEN"].to_numpy(dtype=object),
+            "W": wdl["W"].to_numpy(dtype=np.int64),
+            "D": wdl["D"].to_numpy(dtype=np.int64),
+            "L": wdl["L"].to_numpy(dtype=np.int64),
+            "white": (wdl["stm"] == "w").to_numpy(dtype=bool),
+            "ply": wdl["ply"].to_numpy(dtype=np.int64),
+        }
+        for c in self.columns:
+            setattr(self, c, np.concatenate([getattr(self, c), new[c]]))
+
+    def games_and_drawrates(self):
+        """Return the games played and the draw rates (in percent) per exit."""
+        G = self.W + self.D + self.L
+        dr = np.zeros_like(G)
+        dr[G > 0] = (self.D[G > 0] / G[G > 0] * 100).astype(np.int64)
+        return G, dr
 
     def load_book(self, bookFile):
         self.book = []
@@ -54,98 +245,82 @@ class csvdata:
                 line = line.strip()
                 if not line or line.startswith("#"):
                     continue
-                fenfields = line.split()
+                fenfields = line.split(maxsplit=6)
                 assert len(fenfields) >= 4, f"Incomplete FEN {line}"
                 fen = " ".join(fenfields[:6])
                 self.book.append(fen)
+        self.book_keys = split_fens(pd.Series(self.book, dtype=object))["key"].tolist()
 
     def add_unseen_exits(self):
-        count = 0
-        for fen in self.book:
-            key = " ".join(fen.split()[:4])
-            if key not in self.fenwdl:
-                self.fenwdl[key] = [fen, 0, 0, 0]
-                count += 1
-        return count
+        keys = pd.Index(self.book_keys, dtype=np.uint64)
+        # first occurrences of the book exits that are not in the data yet
+        unseen = ~keys.duplicated() & ~keys.isin(self.keys)
+        if unseen.any():
+            wdl = split_fens(pd.Series(self.book, dtype=object)[unseen])
+            self.add_exits(wdl.set_index("key").assign(W=0, D=0, L=0))
+        return int(unseen.sum())
 
     def calculate_stats(self):
-        self.games = Counter()  # frequencies of games played per book exit
-        self.depth = Counter()  # book depths (in plies)
-        self.drawrate = Counter()  # frequencies of draw rates (in percent)
-        self.total_count = self.white_count = 0
-        self.pos_count = len(self.fenwdl)
-        for key in self.fenwdl:
-            fenfields = self.fenwdl[key][0].split()
-            if (
-                len(fenfields) >= 6
-                and fenfields[4].isdigit()
-                and fenfields[5].isdigit()
-            ):
-                move = int(fenfields[5])
-                ply = (move - 1) * 2 if fenfields[1] == "w" else (move - 1) * 2 + 1
-                self.depth[ply] += 1
-
-            W, D, L = self.fenwdl[key][1], self.fenwdl[key][2], self.fenwdl[key][3]
-            G = W + D + L
-            self.games[G] += 1
-            if G:
-                dr = int(D / G * 100)
-                self.drawrate[dr] += 1
-            self.total_count += G
-            self.white_count += G * (1 if fenfields[1] == "w" else 0)
-
-    def save_csv(self, filename):
+        self.pos_count = len(self.keys)
+        if numba is not None:
+            self.games, self.drawrate, self.depth, total, white = bincount_stats(
+                self.W, self.D, self.L, self.white, self.ply
+            )
+            self.total_count, self.white_count = int(total), int(white)
+            return
+        G, dr = self.games_and_drawrates()
+        self.games = np.bincount(G)  # frequencies of games played per book exit
+        self.depth = np.bincount(self.ply[self.ply >= 0])  # book depths (in plies)
+        # frequencies of draw rates (in percent)
+        self.drawrate = np.bincount(dr[G > 0], minlength=101)
+        self.total_count = int(G.sum())
+        self.white_count = int(G[self.white].sum())
+
+    def save_csv(self, filename, rows=slice(None)):
+        lines = [
+            f"{fen}, {W}, {D}, {L}\n"
+            for fen, W, D, L in zip(
+                self.fens[rows],
+                self.W[rows].tolist(),
+                self.D[rows].tolist(),
+                self.L[rows].tolist(),
+            )
+        ]
         with open(filename, "w") as f:
-            f.write("FEN, Wins, Draws, Losses\n")
-            for key in self.fenwdl:
-                W, D, L = self.fenwdl[key][1], self.fenwdl[key][2], self.fenwdl[key][3]
-                f.write(f"{self.fenwdl[key][0]}, {W}, {D}, {L}\n")
+            f.write("FEN, Wins, Draws, Losses\n" + "".join(lines))
 
     def save_book_csv(self, filename):
-        with open(filename, "w") as f:
-            f.write("FEN, Wins, Draws, Losses\n")
-            for fen in self.book:
-                key = " ".join(fen.split()[:4])
-                W, D, L = self.fenwdl[key][1], self.fenwdl[key][2], self.fenwdl[key][3]
-                f.write(f"{self.fenwdl[key][0]}, {W}, {D}, {L}\n")
+        idx = pd.Index(self.keys).get_indexer(self.book_keys)
+        assert (idx >= 0).all(), "Book exits without data, call add_unseen_exits"
+        self.save_csv(filename, idx)
 
-    def save_epd(self, filename):
+    def save_epd(self, filename, rows=slice(None)):
         with open(filename, "w") as f:
-            for key in self.fenwdl:
-                f.write(f"{self.fenwdl[key][0]}\n")
+            f.write("".join([f"{fen}\n" for fen in self.fens[rows]]))
 
     def filter_exits(self, drawRateMin, drawRateMax, drawRateGames, outFile):
-        filtered = csvdata()
-        for key in self.fenwdl:
-            W, D, L = self.fenwdl[key][1], self.fenwdl[key][2], self.fenwdl[key][3]
-            G = W + D + L
-            dr = int(D / G * 100) if G else 0
-            if G < drawRateGames or (
-                (drawRateMin is None or dr >= drawRateMin)
-                and (drawRateMax is None or dr <= drawRateMax)
-            ):
-                filtered.fenwdl[key] = self.fenwdl[key].copy()
-        filtered.save_csv(outFile)
+        G, dr = self.games_and_drawrates()
+        mask = np.ones(len(G), dtype=bool)
+        if drawRateMin is not None:
+            mask &= dr >= drawRateMin
+        if drawRateMax is not None:
+            mask &= dr <= drawRateMax
+        mask |= G < drawRateGames
+        self.save_csv(outFile, mask)
         epdFile, _, _ = outFile.rpartition(".csv")
         epdFile += ".epd"
-        filtered.save_epd(epdFile)
+        self.save_epd(epdFile, mask)
         print(
-            f"Saved {len(filtered.fenwdl)} filtered positions and stats to {epdFile} and {outFile}."
+            f"Saved {mask.sum()} filtered positions and stats to {epdFile} and {outFile}."
         )
 
     def create_games_per_exit_graph(self):
-        var = 0
-        games = []
-        for fen in self.book:
-            key = " ".join(fen.split()[:4])  # ignore move counters
-            G = 0
-            if key in self.fenwdl:
-                for i in [1, 2, 3]:
-                    G += self.fenwdl[key][i]
-            games.append(G)
-            var += G * G
+        G = pd.Series(self.W + self.D + self.L, index=self.keys)
+        games = pd.Series(self.book_keys, dtype=np.uint64).map(G)
+        games = games.fillna(0).to_numpy(dtype=np.int64)
+        var = int((games**2).sum())
         fig, ax = plt.subplots()
-        mi, ma = min(games), max(games)
+        mi, ma = games.min(), games.max()
         fig.suptitle(f"Games played per book exit. (min: {mi}, max: {ma})")
         num_exits = len(games)
         mean = self.total_count / num_exits
@@ -155,10 +330,20 @@ class csvdata:
             fontsize=7,
         )
         x_data = np.array(range(num_exits))
-        y_data = np.array(games)
-        ax.scatter(x_data, y_data, s=1, alpha=0.2, color="black", label="raw data")
+        y_data = games
+        ax.scatter(
+            x_data,
+            y_data,
+            s=1,
+            alpha=0.2,
+            color="black",
+            rasterized=True,
+            label="raw data",
+        )
         window_size = 5000
-        rolling = np.convolve(y_data, np.ones(window_size) / window_size, mode="valid")
+        # box filter as difference of the prefix sums, O(N) for any window size
+        cumsum = np.cumsum(np.insert(y_data, 0, 0))
+        rolling = (cumsum[window_size:] - cumsum[:-window_size]) / window_size
         x_data_rolling = x_data[(window_size - 1) // 2 : -(window_size - 1) // 2]
         ax.plot(
             x_data_rolling, rolling, color="red", linewidth=1, label="rolling average"
@@ -173,32 +358,28 @@ class csvdata:
         verbose_savefig("games_per_exit.png")
 
     def create_cdb_scatter_plot(self, cdb):
-        evals, drawrates, games = [], [], []
-        for key in self.fenwdl:
-            W, D, L = self.fenwdl[key][1], self.fenwdl[key][2], self.fenwdl[key][3]
-            G = W + D + L
-            if G == 0 or key not in cdb:
-                continue
-            score = cdb[key][0]
-            if score.lstrip("-").isnumeric():
-                e = int(score)
-            elif score.startswith("M"):
-                e = 30000 - int(score[1:])
-            elif score.startswith("-M"):
-                e = -30000 + int(score[2:])
-            else:
-                e = None
-            if e is not None:
-                evals.append(abs(e))
-                dr = D / G * 100
-                games.append(G)
-                drawrates.append(dr)
+        # drop malformed cdb entries, as split_fens needs at least four FEN fields
+        cdb = {k: v for k, v in cdb.items() if len(k.split(maxsplit=4)) >= 4}
+        scores = pd.Series(
+            [v[0] for v in cdb.values()],
+            index=split_fens(pd.Series(cdb.keys(), dtype=object))["key"],
+            dtype=object,
+        )
+        # scores are of the form 42, -42, M5 or -M5, other entries are ignored
+        ext = scores.str.extract(r"^(-)?(M)?(\d+)$").dropna(subset=[2])
+        mag = ext[2].astype(np.int64)
+        evals = mag.where(ext[1].isna(), 30000 - mag).rename("eval")  # absolute
+        G = self.W + self.D + self.L
+        df = pd.DataFrame({"D": self.D, "G": G}, index=self.keys)[G > 0]
+        df = df.join(evals, how="inner")
+        evals, games = df["eval"].to_numpy(), df["G"].to_numpy()
+        drawrates = df["D"].to_numpy() / games * 100
 
         fig, ax = plt.subplots()
         fig.suptitle(f"Draw rate vs (absolute) cdb eval.")
         ax.set_title(f"Source: {self.prefix}.csv", fontsize=8)
-        alpha_fac = 10 * sum(games)**(-0.5)
-        ax.scatter(drawrates, evals, s=4, alpha=[alpha_fac * g for g in games])
+        alpha_fac = 10 * games.sum() ** (-0.5)
+        ax.scatter(drawrates, evals, s=4, alpha=alpha_fac * games, rasterized=True)
         ax.set_xlabel("draw rate (in %)")
         ax.set_ylabel("(absolute) cdb eval (in cp)")
         verbose_savefig("cdb_scatter.png")
@@ -214,7 +395,8 @@ def create_distribution_graph(csvs, plot="drawrate"):
         countList = [c.games for c in csvs]
     rangeMin, rangeMax = None, None
     for d in countList:
-        mi, ma = min(d.keys()), max(d.keys())
+        nz = np.flatnonzero(d)
+        mi, ma = nz[0], nz[-1]
         rangeMin = mi if rangeMin is None else min(mi, rangeMin)
         rangeMax = ma if rangeMax is None else max(ma, rangeMax)
     fig, ax = plt.subplots()
@@ -225,11 +407,12 @@ def create_distribution_graph(csvs, plot="drawrate"):
             white = csvs[Idx].white_count / csvs[Idx].total_count * 100
             g = format_large_number(csvs[Idx].total_count)
             infoStr += f", {g} games (white:black = {white:.0f}:{100-white:.0f})"
-        ax.hist(
-            d.keys(),
-            weights=d.values(),
-            range=(rangeMin, rangeMax),
-            bins=(rangeMax - rangeMin),
+        d = np.pad(d, (0, max(0, rangeMax + 1 - len(d))))
+        ax.bar(
+            np.arange(rangeMin, rangeMax + 1),
+            d[rangeMin : rangeMax + 1],
+            width=1.0,
+            align="edge",
             alpha=0.5,
             color=color[Idx],
             edgecolor=edgecolor[Idx],
@@ -252,35 +435,50 @@ def create_distribution_graph(csvs, plot="drawrate"):
 def line2fen(line):
     line = line.strip()
     if line and not line.startswith("#"):
-        fen = " ".join(line.split()[:4])
+        fen = " ".join(line.split(maxsplit=4)[:4])
         return fen[:-1] if fen[-1] == ";" else fen
     return ""
 
 
-def read_cdb_scores_from_file(filename):
+def parse_cdb_scores(data):
     db = {}
-    with open_file(filename) as f:
-        for line in f:
-            fen = line2fen(line)
-            if fen == "":
-                continue
-            line = line.strip()
-            _, _, cdb = line.partition(" cdb eval: ")
-            if "ply" in cdb:
-                score, _, ply = cdb.partition(", ply: ")
-                ply = int(ply[:-1])
-            else:
-                score, _, _ = cdb.partition(";")
-                ply = None
-            if score == "":
-                continue
-            if fen not in db or (
-                ply is not None and (db[fen][1] is None or db[fen][1] > ply)
-            ):
-                db[fen] = (score, ply)
+    pattern = re.compile(rb"^([^\n]*?) cdb eval: ([^,;\r\n]+)(?:, ply: (\d+))?", re.M)
+    for m in pattern.finditer(data):
+        fen = line2fen(m.group(1).decode())
+        if fen == "":
+            continue
+        score = m.group(2).decode()
+        ply = None if m.group(3) is None else int(m.group(3))
+        if fen not in db or (
+            ply is not None and (db[fen][1] is None or db[fen][1] > ply)
+        ):
+            db[fen] = (score, ply)
     return db
 
 
+def read_cdb_scores_from_file(filename):
+    if filename.endswith(".gz"):
+        with gzip.open(filename, "rb") as f:
+            return parse_cdb_scores(f.read())
+    if not os.path.getsize(filename):
+        return {}
+    with open(filename, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return parse_cdb_scores(mm)
+
+
+def build_csvdata(filename, chunksize, cache, bookFile):
+    """Return the csvdata object with stats for filename, possibly padded with
+    the unseen exits from bookFile, and the number of padded exits."""
+    csv = csvdata(filename, chunksize=chunksize, cache=cache)
+    count = 0
+    if bookFile:
+        csv.load_book(bookFile)
+        count = csv.add_unseen_exits()
+    csv.calculate_stats()
+    return csv, count
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="A script to possibly filter and/or visualize CSV data produced by build/src/analysis. Can either be run for a single .csv to filter and plot, or for two .csv files to produce comparison plots.",
@@ -321,6 +519,17 @@ if __name__ == "__main__":
         "--cdbFile",
         help="Filename with cdb evaluations. Allows a scatter plot of observed draw-rates vs. cdb eval.",
     )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        help="Number of CSV lines to parse at once (roughly, with pyarrow, which also reads ahead several such chunks), to limit memory usage.",
+        default=25_000,
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not use or create the .<filename>.cache.npz files that cache the parsed CSV data.",
+    )
     args = parser.parse_args()
     if len(args.filenames) > 2:
         print("No more than two .csv files allowed.")
@@ -336,12 +545,22 @@ if __name__ == "__main__":
         )
         exit(1)
 
+    build = functools.partial(
+        build_csvdata,
+        chunksize=args.chunksize,
+        cache=not args.no_cache,
+        bookFile=args.bookFile,
+    )
+    if len(args.filenames) > 1:
+        # parse the files in parallel, plots are only created in this process
+        with ProcessPoolExecutor(max_workers=len(args.filenames)) as ex:
+            results = list(ex.map(build, args.filenames))
+    else:
+        results = [build(args.filenames[0])]
+
     csvs = []
-    for f in args.filenames:
-        csv = csvdata(f)
+    for csv, count in results:
         if args.bookFile:
-            csv.load_book(args.bookFile)
-            count = csv.add_unseen_exits()
             if count:
                 print(f"Padded book's CSV data with {count} 0, 0, 0 entries.")
             csv.prefix, _, _ = args.bookFile.rpartition(".epd")
@@ -351,8 +570,6 @@ if __name__ == "__main__":
             ), f"Clash with input filename {csvFile}."
             csv.save_book_csv(csvFile)
             print(f"Saved the book's CSV data to {csvFile}.")
-        csv.calculate_stats()
-        if args.bookFile:
             csv.create_games_per_exit_graph()
         if args.cdbFile:
             cdb = read_cdb_scores_from_file(args.cdbFile)